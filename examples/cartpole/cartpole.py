@@ -1,12 +1,12 @@
 #!/usr/bin/python
 
 from pathlib import Path
-import collections
 import json
 import math
 import mujoco
 import mujoco.viewer
 import npc_maker.env
+import numpy
 import random
 import time
 
@@ -16,6 +16,12 @@ velocity_range  = 1.5
 angle_range     = math.radians(36)
 ang_vel_range   = math.radians(115)
 
+# Reciprocals, for scaling the sensors with a multiply instead of a divide.
+inv_position_range  = 1.0 / position_range
+inv_velocity_range  = 1.0 / velocity_range
+inv_angle_range     = 1.0 / angle_range
+inv_ang_vel_range   = 1.0 / ang_vel_range
+
 # 
 bias_gin     = 0
 angle_gin    = 1
@@ -23,23 +29,17 @@ position_gin = 3
 motor_gin    = 4
 
 def initial_states_sweep():
-    """ Perform a systematic sweep of the initial state space. """
-    percents      = [-.9, -.5, 0, .5, .9]
-    initial_states = []
-    for a in percents:
-        init_position = a * position_range
-        for b in percents:
-            init_angle = b * angle_range
-            for c in percents:
-                init_ang_vel = c * ang_vel_range
-                for d in percents:
-                    init_velocity = d * velocity_range
-                    # 
-                    initial_states.append((
-                        init_position,
-                        init_velocity,
-                        init_angle,
-                        init_ang_vel,))
+    """
+    Perform a systematic sweep of the initial state space.
+
+    Returns an ndarray with shape (num-trials, 4) where the columns are:
+    position, velocity, angle, and angular velocity.
+    """
+    percents   = numpy.array([-.9, -.5, 0, .5, .9])
+    # The sweep iterates over position, angle, angular velocity, and then velocity.
+    p, a, q, v = numpy.meshgrid(percents, percents, percents, percents, indexing='ij')
+    initial_states = numpy.stack((p, v, a, q), axis=-1).reshape(-1, 4)
+    initial_states *= (position_range, velocity_range, angle_range, ang_vel_range)
     return initial_states
 
 class CartpoleEnvironment(npc_maker.env.SoloAPI):
@@ -48,6 +48,10 @@ class CartpoleEnvironment(npc_maker.env.SoloAPI):
         mjcf_file  = str(spec["spec"].with_suffix(".mjcf"))
         self.model = mujoco.MjModel.from_xml_path(mjcf_file)
         self.data  = mujoco.MjData(self.model)
+        # Cache the named accessors, they do a string lookup on every call.
+        self.slider = self.data.joint("slider")
+        self.hinge  = self.data.joint("hinge")
+        self.motor  = self.data.actuator("motor").ctrl
         if mode == "graphical":
             self.viewer = mujoco.viewer.launch_passive(self.model, self.data,
                                         show_left_ui=False, show_right_ui=False)
@@ -61,10 +65,10 @@ class CartpoleEnvironment(npc_maker.env.SoloAPI):
         self.sweep      = settings["sweep"]
         self.trials     = settings["trials"]
         self.time       = settings["time"]
-        self.angle      = settings["angle"]
+        self.angle      = math.radians(settings["angle"])
         if self.sweep:
             self.init   = initial_states_sweep()
-            self.trials = len(self.initial_states)
+            self.trials = len(self.init)
             self.time   = 10
             del self.angle
         self.reset_individual()
@@ -75,7 +79,12 @@ class CartpoleEnvironment(npc_maker.env.SoloAPI):
         self.ctrl         = None
         self.scores       = [] # Score for each trial.
         self.survived     = [] # How many timesteps it survive in each trial.
-        self.oscillations = collections.deque()
+        # Ring buffer holding the last 100 oscillation measurements,
+        # with an incrementally maintained running sum.
+        self.oscillations = [0.0] * 100
+        self.osc_index    = 0
+        self.osc_count    = 0
+        self.osc_sum      = 0.0
 
     def advance(self, name, controller):
         """ Run the environment forward one step. """
@@ -94,62 +103,58 @@ class CartpoleEnvironment(npc_maker.env.SoloAPI):
         mujoco.mj_resetData(self.model, self.data)
         if self.ctrl is not None:
             self.ctrl.reset()
-        self.num_steps = 0
+        self.num_steps   = 0
+        self.alive_check = 0
         # Initialize the cart & pole positions.
         if self.sweep:
             trial_num  = len(self.scores)
             p, v, a, q = self.init[trial_num]
-            self.data.joint("slider").qpos[0] = p
-            self.data.joint("slider").qvel[0] = v
-            self.data.joint("hinge").qpos[0]  = a
-            self.data.joint("hinge").qvel[0]  = q
+            self.slider.qpos[0] = p
+            self.slider.qvel[0] = v
+            self.hinge.qpos[0]  = a
+            self.hinge.qvel[0]  = q
         else:
-            angle = math.radians(self.angle)
-            self.data.joint("slider").qpos[0] = 0.0
-            self.data.joint("slider").qvel[0] = 0.0
-            self.data.joint("hinge").qpos[0]  = random.uniform(-angle, angle)
-            self.data.joint("hinge").qvel[0]  = 0.0
+            self.slider.qpos[0] = 0.0
+            self.slider.qvel[0] = 0.0
+            self.hinge.qpos[0]  = random.uniform(-self.angle, self.angle)
+            self.hinge.qvel[0]  = 0.0
 
     def advance_controller(self, position, velocity, angle):
         """
         Run the control system. Transfer sensory inputs and motor outputs
         between the simulation and the controller.
         """
-        if not self.ctrl.is_alive():
-            self.quit()
-        # 
-        self.ctrl.set_input(bias_gin,     1.0)
-        self.ctrl.set_input(angle_gin,    angle)
-        self.ctrl.set_input(position_gin, position)
+        # Periodically check that the controller process is still running.
+        self.alive_check += 1
+        if self.alive_check >= 50:
+            self.alive_check = 0
+            if not self.ctrl.is_alive():
+                self.quit()
+        #
+        self.ctrl.set_inputs({
+            bias_gin:     1.0,
+            angle_gin:    angle,
+            position_gin: position,})
         # 
         self.ctrl.advance(self.dt)
         # Write the motor outputs into the mujoco simulation.
         output = float(self.ctrl.get_outputs(motor_gin))
-        output = max(-1.0, min(1.0, output))
-        self.data.actuator("motor").ctrl = output
+        self.motor[0] = -1.0 if output < -1.0 else 1.0 if output > 1.0 else output
 
     def advance_environment(self):
         # Read the cart's sensor data.
-        position    = self.data.joint("slider").qpos[0]
-        velocity    = self.data.joint("slider").qvel[0]
-        angle       = self.data.joint("hinge").qpos[0]
-        ang_vel     = self.data.joint("hinge").qvel[0]
+        position    = self.slider.qpos[0]
+        velocity    = self.slider.qvel[0]
+        angle       = self.hinge.qpos[0]
+        ang_vel     = self.hinge.qvel[0]
         # Scale the sensory inputs into the range [-1, +1]
-        position /= position_range
-        velocity /= velocity_range
-        angle    /= angle_range
-        ang_vel  /= ang_vel_range
+        position *= inv_position_range
+        velocity *= inv_velocity_range
+        angle    *= inv_angle_range
+        ang_vel  *= inv_ang_vel_range
         # Run the control system.
         if self.ctrl is not None:
             self.advance_controller(position, velocity, angle)
-        # Measure the magnitude of the oscillations.
-        self.oscillations.append(
-            abs(position) +
-            abs(velocity) +
-            abs(angle) +
-            abs(ang_vel))
-        while len(self.oscillations) > 100:
-            self.oscillations.popleft()
         # Advance the mujoco simulation.
         mujoco.mj_step(self.model, self.data)
         self.num_steps += 1
@@ -159,41 +164,56 @@ class CartpoleEnvironment(npc_maker.env.SoloAPI):
         survived          = not (fallen_pole or runaway_cart)
         episode_time      = self.num_steps * self.dt
         timelimit_reached = episode_time >= self.time
-        if not survived or timelimit_reached:
-            # Determine how many timesteps the controller survived.
-            if not survived:
-                episode_time -= self.dt # Ignore the current timestep if it died.
-            self.survived.append(episode_time)
-            # Calculate the score for this trial.
-            time_score = episode_time / self.time
-            if len(self.oscillations) < 100:
-                oscillation_score = 0
-            else:
-                oscillation_score = 0.75 / sum(self.oscillations)
-            score = 0.1 * time_score + 0.9 * oscillation_score
-            self.scores.append(score)
-            # Was this the final trial? Either prepare this individual for its
-            # next trial or report its final score.
-            if len(self.scores) < self.trials:
-                self.start_trial()
-            else:
-                # Report the fraction of the trials that were successful.
-                successful = sum(t >= self.time for t in self.survived)
-                npc_maker.env.info(self.name,
-                    {"generalization": successful / self.trials})
-                # Report this individual's final score.
-                return sum(self.scores) / len(self.scores)
+        if survived and not timelimit_reached:
+            # Measure the magnitude of the oscillations.
+            oscillation   = abs(position) + abs(velocity) + abs(angle) + abs(ang_vel)
+            self.osc_sum += oscillation - self.oscillations[self.osc_index]
+            self.oscillations[self.osc_index] = oscillation
+            self.osc_index = (self.osc_index + 1) % 100
+            if self.osc_count < 100:
+                self.osc_count += 1
+            return
+        # Determine how many timesteps the controller survived.
+        if not survived:
+            episode_time -= self.dt # Ignore the current timestep if it died.
+        self.survived.append(episode_time)
+        # Calculate the score for this trial.
+        time_score = episode_time / self.time
+        if self.osc_count < 100:
+            oscillation_score = 0
+        else:
+            oscillation_score = 0.75 / self.osc_sum
+        score = 0.1 * time_score + 0.9 * oscillation_score
+        self.scores.append(score)
+        # Was this the final trial? Either prepare this individual for its
+        # next trial or report its final score.
+        if len(self.scores) < self.trials:
+            self.start_trial()
+        else:
+            # Report the fraction of the trials that were successful.
+            successful = sum(t >= self.time for t in self.survived)
+            npc_maker.env.telemetry(self.name,
+                {"generalization": successful / self.trials})
+            # Report this individual's final score.
+            return sum(self.scores) / len(self.scores)
 
     def update_graphics(self):
         if self.viewer and self.viewer.is_running():
             # Limit the framerate to not run faster than the underlying simulation.
-            if hasattr(self, "_last_frame_timestamp"):
-                elapsed_time = time.monotonic() - self._last_frame_timestamp
-                frame_time   = self.dt - elapsed_time
-                time.sleep(max(0, frame_time))
-            # 
+            frame_ns = round(self.dt * 1e9)
+            now      = time.perf_counter_ns()
+            if hasattr(self, "_next_frame_ns"):
+                sleep_ns = self._next_frame_ns - now
+                if sleep_ns > 0:
+                    time.sleep(sleep_ns / 1e9)
+                    self._next_frame_ns += frame_ns
+                else:
+                    # Fell behind schedule, restart the deadline from now.
+                    self._next_frame_ns = now + frame_ns
+            else:
+                self._next_frame_ns = now + frame_ns
+            #
             self.viewer.sync()
-            self._last_frame_timestamp = time.monotonic()
 
     def quit(self):
         """ Cleanup and exit. """
@@ -202,6 +222,9 @@ class CartpoleEnvironment(npc_maker.env.SoloAPI):
         self.reset_individual()
         self.model  = None
         self.data   = None
+        self.slider = None
+        self.hinge  = None
+        self.motor  = None
         self.viewer = None
 
 if __name__ == "__main__":
@@ -1,7 +1,6 @@
 import json
 import npc_maker.evo
 import random
-import copy
 
 gin = 0
 
@@ -19,9 +18,11 @@ class NeatGenome(npc_maker.evo.Genome):
         for gene in self.genes:
             other_gene = other_genes.get(gene.name)
             if other_gene is not None:
-                if getattr(gene, 'disabled', False) and getattr(other_gene, 'disabled', False):
+                disabled_1 = getattr(gene, 'disabled', False)
+                disabled_2 = getattr(other_gene, 'disabled', False)
+                if disabled_1 and disabled_2:
                     disabled = True
-                elif getattr(gene, 'disabled', False) or getattr(other_gene, 'disabled', False):
+                elif disabled_1 or disabled_2:
                     disabled = random.random() < 0.75
                 else:
                     disabled = False
@@ -30,22 +31,27 @@ class NeatGenome(npc_maker.evo.Genome):
                     gene = other_gene
                 # 
                 if disabled:
-                    gene = copy.deepcopy(gene)
+                    gene = gene.clone()
                     gene.disabled = True
             child_genes.append(gene)
-        # 
+        #
         child = NeatGenome()
-        child.genes = copy.deepcopy(child_genes)
+        child.genes = [gene.clone() for gene in child_genes]
         child.mutate()
         return child
 
     def mutate(self):
-        edges = filter(lambda gene: isinstance(gene, Edge), self.genes)
-        edges = filter(lambda edge: not edge.disabled, edges)
-        nodes = filter(lambda gene: isinstance(gene, Node), self.genes)
+        # Sort the genes by type, in a single pass.
+        edges = []
+        nodes = []
+        for gene in self.genes:
+            if isinstance(gene, Edge):
+                if not gene.disabled:
+                    edges.append(gene)
+            else:
+                nodes.append(gene)
         # Structural mutation: add node.
         if random.random() < 0.03:
-            edges = list(edges)
             if not edges:
                 return
             replace = random.choice(edges)
@@ -58,14 +64,14 @@ class NeatGenome(npc_maker.evo.Genome):
 
         # Structural mutation: add edge.
         elif random.random() < 0.15:
-            nodes = list(nodes)
             if len(nodes) < 2:
                 return
             nodes = random.sample(nodes, 2)
             presyn = nodes[0].name
             postsyn = nodes[1].name
             # Check if the edge already exists.
-            if any(edge.presyn == presyn and edge.postsyn == postsyn for edge in edges):
+            existing = {(edge.presyn, edge.postsyn) for edge in edges}
+            if (presyn, postsyn) in existing:
                 return
             self.add_edge(presyn, postsyn)
 
@@ -139,8 +145,17 @@ class NeatGenome(npc_maker.evo.Genome):
                 setattr(y, attr, value)
             self.genes.append(y)
 
-class Node:
+class Gene:
+    __slots__ = ()
+    def clone(self):
+        """ Copy this gene. All of the fields are primitive values. """
+        other = type(self).__new__(type(self))
+        for attr in self.__slots__:
+            setattr(other, attr, getattr(self, attr))
+        return other
+
+class Node(Gene):
     __slots__ = ('name', 'type', 'slope', 'midpoint')
 
-class Edge:
+class Edge(Gene):
     __slots__ = ('name', 'type', 'presyn', 'postsyn', 'weight', 'disabled')
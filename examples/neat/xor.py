@@ -6,7 +6,7 @@ import mate_selection
 import neat
 import npc_maker.env
 import npc_maker.evo
-import time
+import selectors
 from pathlib import Path
 
 repo = Path(__file__).parent.parent.parent
@@ -36,14 +36,20 @@ def test_neat():
                 for _ in range(num_threads)]
     for env in env_pool:
         env.start()
+    # Wait on all of the environments at once, instead of polling each one.
+    sel = selectors.DefaultSelector()
+    for env in env_pool:
+        sel.register(env, selectors.EVENT_READ)
 
     # Run the evolutionary algorithm.
     generation = 0
     while evo.get_generation() < 100:
-        for env in env_pool:
-            env.poll()
-            time.sleep(0)
-        # 
+        for key, _ in sel.select(timeout=0.1):
+            # Messages are buffered in user space, so drain each ready
+            # environment until poll() reports nothing more is pending.
+            while key.fileobj.poll() is not None:
+                pass
+        #
         if generation < evo.get_generation():
             generation = evo.get_generation()
             best = evo.get_best()
@@ -9,6 +9,8 @@ from math import exp
 def logistic(value, slope=1, midpoint=0):
     # The magic number 4.0 scales the maximum slope of the curve to 1.0
     x = 4.0 * slope * (value - midpoint)
+    # Clamp the exponent to avoid overflow; the result saturates regardless.
+    x = max(-700.0, min(700.0, x))
     return 1.0 / (1.0 + exp(-x) )
 
 if __name__ == '__main__':
@@ -6,69 +6,84 @@ Example controller - artificial neural network
 This file demonstrates how to implement a control system for the NPC Maker.
 """
 
+import functools
 import json
-import math
+import numpy
 import npc_maker.ctrl
 
-def logistic(value, slope=1, midpoint=0):
+@functools.lru_cache(maxsize=16)
+def _parse_genome(genome):
+    """
+    Parse a JSON genome into parallel arrays.
+
+    The results are cached so that reloading a recently seen genome skips the
+    JSON parse. The returned arrays are shared between cache hits and must
+    not be modified.
+    """
+    genome = json.loads(genome)
+    # Assign a contiguous index to each node.
+    names = {}
+    nodes = []
+    for entity in genome:
+        if entity["type"] == "Node":
+            gin = int(entity["name"])
+            names[gin] = len(nodes)
+            nodes.append(entity)
+    # Store the node parameters as parallel arrays.
+    slopes    = numpy.array([float(node["slope"])    for node in nodes])
+    midpoints = numpy.array([float(node["midpoint"]) for node in nodes])
+    # Fold the constants of the logistic function into two arrays, so that
+    # the argument of the exponential is just "scale * value + offset".
     # The magic number 4 scales the maximum slope of the curve to 1
-    x = 4.0 * slope * (value - midpoint)
-    try:
-        e = math.exp(-x)
-    except OverflowError:
-        e = math.inf
-    return 1.0 / (1.0 + e)
+    scale  = -4.0 * slopes
+    offset = -scale * midpoints
+    # Store the edges as parallel arrays of node indices and weights.
+    presyn  = []
+    postsyn = []
+    weights = []
+    for entity in genome:
+        if entity["type"] == "Edge":
+            presyn.append( names[int(entity["presyn"])])
+            postsyn.append(names[int(entity["postsyn"])])
+            weights.append(float(entity["weight"]))
+    presyn  = numpy.array(presyn,  dtype=numpy.intp)
+    postsyn = numpy.array(postsyn, dtype=numpy.intp)
+    weights = numpy.array(weights)
+    return (names, scale, offset, presyn, postsyn, weights)
 
 class NN(npc_maker.ctrl.API):
     def genome(self, environment, population, genome):
-        self.names      = {}
-        self.states     = []
-        self.slopes     = []
-        self.midpoints  = []
-        self.edges      = []
-        # 
-        genome = json.loads(genome)
-        # 
-        for entity in genome:
-            if entity["type"] == "Node":
-                gin = int(entity["name"])
-                idx = len(self.names)
-                self.names[gin] = idx
-                self.states.append(0.0)
-                self.slopes.append(float(entity["slope"]))
-                self.midpoints.append(float(entity["midpoint"]))
-        # 
-        for entity in genome:
-            if entity["type"] == "Edge":
-                presyn  = int(entity["presyn"])
-                postsyn = int(entity["postsyn"])
-                presyn  = self.names[presyn]
-                postsyn = self.names[postsyn]
-                weight  = float(entity["weight"])
-                self.edges.append((presyn, postsyn, weight))
+        (self.names, self.scale, self.offset,
+            self.presyn, self.postsyn, self.weights) = _parse_genome(bytes(genome))
+        # Double buffer the states, swapped on every tick.
+        self.states = numpy.zeros(len(self.scale))
+        self._next  = numpy.zeros(len(self.scale))
 
     def reset(self):
-        for idx in range(len(self.states)):
-            self.states[idx] = 0.0
+        self.states.fill(0.0)
 
     def advance(self, dt):
-        next_states = [0.0 for _ in range(len(self.states))]
-        for (presyn, postsyn, weight) in self.edges:
-            next_states[postsyn] += weight * self.states[presyn]
-        for i in range(len(self.states)):
-            next_states[i] = logistic(next_states[i], self.slopes[i], self.midpoints[i])
+        # Propagate the states through the weighted edges.
+        next_states = self._next
+        next_states.fill(0.0)
+        numpy.add.at(next_states, self.postsyn, self.weights * self.states[self.presyn])
+        # Apply the logistic function in place, without temporary arrays.
+        next_states *= self.scale
+        next_states += self.offset
+        # Clamp the exponent to avoid overflow; the result saturates regardless.
+        numpy.minimum(next_states, 700.0, out=next_states)
+        numpy.exp(next_states, out=next_states)
+        next_states += 1.0
+        numpy.reciprocal(next_states, out=next_states)
+        self._next  = self.states
         self.states = next_states
 
     def set_input(self, gin, value):
-        gin   = int(gin)
-        value = float(value)
-        index = self.names[gin]
-        self.states[index] = value
+        # The array assignment coerces the value, including numeric strings.
+        self.states[self.names[gin]] = value
 
     def get_output(self, gin):
-        gin   = int(gin)
-        index = self.names[gin]
-        return self.states[index]
+        return self.states[self.names[gin]]
 
 if __name__ == "__main__":
     NN().main()
@@ -66,12 +66,11 @@ class XorTest(env.SoloAPI):
                 steadystate = False
                 prev = None
                 for _ in range(4):
-                    controller.set_input(0, input_1)
-                    controller.set_input(1, input_2)
+                    controller.set_inputs({0: input_1, 1: input_2})
                     controller.advance(1.0)
                     answer = float(controller.get_outputs(2))
-                    # 
-                    if answer == prev:
+                    #
+                    if prev is not None and abs(answer - prev) < 1e-6:
                         steadystate = True
                         break
                     else:
@@ -79,7 +78,7 @@ class XorTest(env.SoloAPI):
                 # Update the score.
                 if steadystate:
                     correct = float(input_1 != input_2)
-                    answer  = max(0.0, min(1.0, answer))
+                    answer  = 0.0 if answer < 0.0 else 1.0 if answer > 1.0 else answer
                     distance += abs(answer - correct)
                     if self.verbose:
                         env.eprint(f"{input_1} xor {input_2} = {answer}")
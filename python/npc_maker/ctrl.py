@@ -4,14 +4,23 @@ Controller Interface, for making and using control systems.
 
 from pathlib import Path
 import errno
+import functools
+import os
+import selectors
 import shlex
 import subprocess
 import sys
 import time
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 __all__ = (
     "API",
     "Controller",
+    "Gather",
     "eprint",
 )
 
@@ -26,11 +35,25 @@ def eprint(*args, **kwargs):
     print(*args, **kwargs, file=sys.stderr, flush=True)
 
 def _clean_ctrl_command(command):
+    # Population runs construct many controllers from the same command, so the
+    # parsing and path resolution are cached on the command's hashable form.
     if command is None:
         return None
     elif isinstance(command, Path):
-        command = [command]
-    elif isinstance(command, str):
+        command = (command,)
+    elif not isinstance(command, str):
+        command = tuple(command)
+    try:
+        result = _clean_ctrl_command_impl(command)
+    except TypeError: # Unhashable command line argument.
+        result = _clean_ctrl_command_impl.__wrapped__(command)
+    if result is None:
+        return None
+    return list(result)
+
+@functools.lru_cache(maxsize=128)
+def _clean_ctrl_command_impl(command):
+    if isinstance(command, str):
         command = shlex.split(command)
     else:
         command = list(command)
@@ -42,11 +65,7 @@ def _clean_ctrl_command(command):
         arg = command[index]
         if not isinstance(arg, bytes) and not isinstance(arg, str):
             command[index] = str(arg)
-    return command
-
-# TODO: Make a new version of Controller.get_outputs that is split into
-# request/receive phases so that users can get outputs from many controllers
-# all at once.
+    return tuple(command)
 
 # TODO: Add a timeout for reading from the controller's stdin.
 
@@ -60,7 +79,7 @@ class Controller:
 
     This object's destruction triggers the controller to terminate.
     """
-    def __init__(self, environment, population, command, stderr=sys.stderr):
+    def __init__(self, environment, population, command, stderr=None, coalesce=True):
         """
         Argument environment is the path of the environment specification file.
 
@@ -72,19 +91,42 @@ class Controller:
 
         Argument stderr is the file descriptor to use for the subprocess's stderr channel.
                  By default, the controller will inherit this process's stderr channel.
+
+        Argument coalesce controls buffering for outgoing messages. By default
+                 messages are buffered and sent in batches, which favors
+                 throughput; see the "flush()" method. Set coalesce=False to
+                 write each message to the pipe immediately, which favors
+                 latency.
         """
         if isinstance(environment, dict):
             environment = environment["spec"]
         self.environment    = Path(environment)
         self.population     = str(population)
         self.command        = _clean_ctrl_command(command)
+        # Inheriting stderr implicitly and leaving close_fds off lets Popen
+        # use posix_spawn instead of fork+exec, which skips copying the
+        # parent's page tables. The pipe fds are close-on-exec, so nothing
+        # leaks into the child regardless.
         self._ctrl          = subprocess.Popen(self.command,
             stdin           = subprocess.PIPE,
             stdout          = subprocess.PIPE,
-            stderr          = stderr)
+            stderr          = stderr,
+            close_fds       = False,
+            bufsize         = 65536 if coalesce else 0)
+        self._pending       = bytearray() # Partial messages from the controller's stdout.
+        self._stdout_fd     = self._ctrl.stdout.fileno()
+        # On Linux, enlarge the pipes so that a burst of messages fits
+        # without blocking either process.
+        if fcntl is not None and hasattr(fcntl, "F_SETPIPE_SZ"):
+            for pipe in (self._ctrl.stdin, self._ctrl.stdout):
+                try:
+                    fcntl.fcntl(pipe.fileno(), fcntl.F_SETPIPE_SZ, 1 << 20)
+                except OSError:
+                    pass # Capped by /proc/sys/fs/pipe-max-size.
         # 
-        self._ctrl.stdin.write("E{}\n".format(self.environment).encode("utf-8"))
-        self._ctrl.stdin.write("P{}\n".format(self.population).encode("utf-8"))
+        self._ctrl.stdin.write(b"E%b\nP%b\n" % (
+            str(self.environment).encode("utf-8"),
+            self.population.encode("utf-8")))
 
     def is_alive(self):
         """
@@ -92,6 +134,23 @@ class Controller:
         """
         return self._ctrl.returncode is None
 
+    def fileno(self):
+        """
+        Returns the file descriptor of the controller's stdout pipe,
+        for use with the "select" and "selectors" modules.
+        """
+        return self._stdout_fd
+
+    def flush(self):
+        """
+        Send all buffered messages to the controller subprocess.
+
+        Outgoing messages are buffered and written to the controller in
+        batches. The methods which read the controller's response flush
+        automatically.
+        """
+        self._ctrl.stdin.flush()
+
     def get_environment(self):
         """
         Get the "environment" argument.
@@ -129,8 +188,49 @@ class Controller:
         if isinstance(value, str):
             value = bytes(value, encoding="utf-8")
         assert isinstance(value, bytes)
-        self._ctrl.stdin.write("G{}\n".format(len(value)).encode("utf-8"))
-        self._ctrl.stdin.write(value)
+        self._write_framed(b"G%d\n" % len(value), value)
+
+    def genome_from_file(self, path):
+        """
+        Initialize the control system with a new genome, read from a file.
+        This discards the currently loaded model.
+
+        Where the OS supports it, the file is streamed into the controller
+        without copying it through this process.
+        """
+        with open(path, "rb") as file:
+            self._send_file(b"G%d\n", file)
+
+    def load_from_file(self, path):
+        """
+        Load a previously saved controller, read from a file.
+
+        Where the OS supports it, the file is streamed into the controller
+        without copying it through this process.
+        """
+        with open(path, "rb") as file:
+            self._send_file(b"L%d\n", file)
+
+    def _send_file(self, header, file):
+        size = os.fstat(file.fileno()).st_size
+        self._ctrl.stdin.write(header % size)
+        self._ctrl.stdin.flush()
+        fd     = self._ctrl.stdin.fileno()
+        offset = 0
+        try:
+            # Zero-copy transfer. Linux allows pipe targets; elsewhere
+            # sendfile may be missing or socket-only.
+            while offset < size:
+                sent = os.sendfile(fd, file.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            pass
+        if offset < size:
+            file.seek(offset)
+            while chunk := file.read(65536):
+                self._ctrl.stdin.write(chunk)
 
     def reset(self):
         """
@@ -145,7 +245,7 @@ class Controller:
         Argument dt is in units of seconds.
         """
         dt = float(dt)
-        self._ctrl.stdin.write("A{}\n".format(dt).encode("utf-8"))
+        self._ctrl.stdin.write(b"A%b\n" % repr(dt).encode("ascii"))
 
     def set_input(self, gin, value):
         """
@@ -155,7 +255,25 @@ class Controller:
         gin   = int(gin)
         assert '\n' not in value
         assert gin >= 0
-        self._ctrl.stdin.write("I{}\n{}\n".format(gin, value).encode("utf-8"))
+        self._ctrl.stdin.write(b"I%d\n%b\n" % (gin, value.encode("utf-8")))
+
+    def set_inputs(self, inputs):
+        """
+        Write multiple values to GINs in the controller.
+
+        Argument inputs is a mapping of GIN -> value.
+
+        This is equivalent to calling "set_input()" on each pair, except that
+        all of the messages are formatted and written in a single call.
+        """
+        message = []
+        for gin, value in inputs.items():
+            value = str(value)
+            gin   = int(gin)
+            assert '\n' not in value
+            assert gin >= 0
+            message.append(b"I%d\n%b\n" % (gin, value.encode("utf-8")))
+        self._ctrl.stdin.write(b"".join(message))
 
     def set_binary(self, gin, binary):
         """
@@ -165,8 +283,7 @@ class Controller:
         gin = int(gin)
         assert isinstance(binary, bytes)
         assert gin >= 0
-        self._ctrl.stdin.write("B{}\n{}\n".format(gin, len(binary)).encode("utf-8"))
-        self._ctrl.stdin.write(binary)
+        self._write_framed(b"B%d\n%d\n" % (gin, len(binary)), binary)
 
     def get_outputs(self, gin_list):
         """
@@ -174,54 +291,151 @@ class Controller:
 
         This method blocks on IO.
         """
-        return_list = True
-        if hasattr(gin_list, "__iter__"):
-            gin_list    = list(gin_list)
-        else:
-            gin_list    = [gin_list]
-            return_list = False
-        # Request the outputs.
-        for gin in gin_list:
-            gin = int(gin)
-            assert gin >= 0
-            self._ctrl.stdin.write("O{}\n".format(gin).encode("utf-8"))
+        if not hasattr(gin_list, "__iter__"):
+            # Fast path for a single GIN: no intermediate containers.
+            return self._get_output_one(int(gin_list))
+        gin_list = self.request_outputs(gin_list)
+        return self.receive_outputs(gin_list)
+
+    def request_outputs(self, gin_list):
+        """
+        Send requests for outputs without waiting for the replies.
+
+        Call "receive_outputs()" to collect the replies. Splitting the
+        request and receive phases lets users pipeline many controllers,
+        so that the total latency is the max instead of the sum.
+
+        Returns the normalized GIN list, for passing to "receive_outputs()".
+        """
+        if not hasattr(gin_list, "__iter__"):
+            gin_list = [gin_list]
+        # Convert to int once and discard duplicates, which would otherwise
+        # leave receive_outputs waiting for replies that never come.
+        gin_list = list(dict.fromkeys(int(gin) for gin in gin_list))
+        assert all(gin >= 0 for gin in gin_list)
+        # Format all of the requests into a single write.
+        self._ctrl.stdin.write(b"".join(b"O%d\n" % gin for gin in gin_list))
         self._ctrl.stdin.flush()
-        # Receive the outputs.
+        return gin_list
+
+    def receive_outputs(self, gin_list, decode=True):
+        """
+        Collect the replies to a preceding "request_outputs()" call.
+
+        This method blocks on IO.
+
+        Argument decode controls the value conversion. By default the values
+        are decoded into str. Pass decode=False to get the raw bytes, which
+        "float()" and "int()" accept directly, skipping a str allocation per
+        output.
+
+        Returns a mapping of GIN -> value.
+        """
         outputs = {}
         while len(outputs) < len(gin_list):
-            message = self._ctrl.stdout.readline().decode("utf-8").lstrip()
+            message = self._recv_line().lstrip()
             if not message:
                 continue
-            msg_type = message[0]
-            msg_body = message[1:]
-            assert msg_type.upper() == 'O'
-            gin = int(msg_body.strip())
-            outputs[gin] = self._ctrl.stdout.readline().decode("utf-8")
-        assert set(outputs) == set(gin_list)
-        if return_list:
-            return outputs
+            assert message[:1].upper() == b'O'
+            gin = int(message[1:])
+            outputs[gin] = self._recv_line()
+        assert outputs.keys() == set(gin_list)
+        if decode:
+            outputs = {gin: value.decode("utf-8") for gin, value in outputs.items()}
+        return outputs
+
+    def _get_output_one(self, gin):
+        assert gin >= 0
+        self._ctrl.stdin.write(b"O%d\n" % gin)
+        self._ctrl.stdin.flush()
+        while True:
+            message = self._recv_line().lstrip()
+            if message:
+                break
+        assert message[:1].upper() == b'O'
+        assert int(message[1:]) == gin
+        return self._recv_line().decode("utf-8")
+
+    def _write_framed(self, header, payload):
+        # Small payloads are cheaper to send as one concatenated write.
+        # Large payloads are written separately, which skips the O(n) copy;
+        # the buffered writer forwards them to the pipe directly.
+        if len(payload) < 65536:
+            self._ctrl.stdin.write(header + payload)
         else:
-            return outputs.popitem()[1]
+            self._ctrl.stdin.write(header)
+            self._ctrl.stdin.write(payload)
+
+    def _parse_replies(self, outputs):
+        # Pop any complete output replies out of the receive buffer.
+        pending = self._pending
+        while True:
+            first = pending.find(b"\n")
+            if first == -1:
+                return
+            message = bytes(pending[:first]).lstrip()
+            if not message:
+                del pending[:first + 1]
+                continue
+            second = pending.find(b"\n", first + 1)
+            if second == -1:
+                return
+            assert message[:1].upper() == b'O'
+            gin = int(message[1:])
+            outputs[gin] = bytes(pending[first + 1 : second]).decode("utf-8")
+            del pending[:second + 1]
+
+    def _recv_bytes(self, num_bytes):
+        # Return exactly num_bytes from the controller's stdout.
+        pending = self._pending
+        while len(pending) < num_bytes:
+            chunk = os.read(self._stdout_fd, 65536)
+            if not chunk:
+                raise EOFError("controller stdout closed")
+            pending.extend(chunk)
+        data = bytes(pending[:num_bytes])
+        del pending[:num_bytes]
+        return data
+
+    def _recv_line(self):
+        # Return the next line from the controller's stdout.
+        # Reads in bulk and splits the lines in-memory.
+        pending = self._pending
+        while True:
+            index = pending.find(b"\n")
+            if index != -1:
+                line = bytes(pending[:index])
+                del pending[:index + 1]
+                return line
+            chunk = os.read(self._stdout_fd, 65536)
+            if not chunk:
+                raise EOFError("controller stdout closed")
+            pending.extend(chunk)
 
     def save(self):
         """
         Request the current state of the controller.
+
+        This method blocks on IO.
+
+        Returns the save state as bytes, which "load()" accepts.
         """
-        path = Path(path)
-        assert '\n' not in str(path)
         self._ctrl.stdin.write(b"S\n")
         self._ctrl.stdin.flush()
-        # TODO: Wait for the controller's response.
-        raise NotImplementedError
-        return save_state
+        while True:
+            message = self._recv_line().lstrip()
+            if message:
+                break
+        assert message[:1].upper() == b'S'
+        num_bytes = int(message[1:])
+        return self._recv_bytes(num_bytes)
 
     def load(self, save_state):
         """
         Load a previously saved controller.
         """
         assert isinstance(save_state, bytes)
-        self._ctrl.stdin.write("L{}\n".format(len(save_state)).encode("utf-8"))
-        self._ctrl.stdin.write(save_state)
+        self._write_framed(b"L%d\n" % len(save_state), save_state)
 
     def custom(self, message_type, message_body):
         """
@@ -244,59 +458,134 @@ class Controller:
                 if error.errno == errno.EPIPE:
                     pass
 
+class Gather:
+    """
+    Collect outputs from many controllers at once.
+
+    All of the requests are sent up front, and then a selector multiplexes
+    over the controllers' stdout pipes so that this thread services whichever
+    controller responds first, instead of blocking on each controller in turn.
+    """
+    def __init__(self):
+        self._requests = {}
+
+    def add(self, controller, gin_list):
+        """
+        Request outputs from a controller, as identified by their GIN.
+        """
+        if not hasattr(gin_list, "__iter__"):
+            gin_list = [gin_list]
+        gin_list = [int(gin) for gin in gin_list]
+        assert all(gin >= 0 for gin in gin_list)
+        self._requests.setdefault(controller, []).extend(gin_list)
+
+    def run(self):
+        """
+        Wait for all of the requested outputs.
+
+        Returns a mapping of controller -> {GIN: value}
+        """
+        sel     = selectors.DefaultSelector()
+        results = {}
+        active  = 0
+        for controller, gin_list in self._requests.items():
+            # Discard duplicate requests, which are only answered once.
+            gin_list = self._requests[controller] = list(dict.fromkeys(gin_list))
+            controller._ctrl.stdin.write(b"".join(b"O%d\n" % gin for gin in gin_list))
+            controller._ctrl.stdin.flush()
+            results[controller] = outputs = {}
+            # Check for replies which are already buffered.
+            controller._parse_replies(outputs)
+            if len(outputs) < len(gin_list):
+                sel.register(controller._stdout_fd, selectors.EVENT_READ, controller)
+                active += 1
+        while active:
+            for key, _ in sel.select():
+                controller = key.data
+                chunk = os.read(controller._stdout_fd, 65536)
+                if not chunk:
+                    raise EOFError("controller stdout closed")
+                controller._pending.extend(chunk)
+                outputs = results[controller]
+                controller._parse_replies(outputs)
+                if len(outputs) >= len(self._requests[controller]):
+                    sel.unregister(controller._stdout_fd)
+                    active -= 1
+        sel.close()
+        self._requests.clear()
+        return results
+
 _stdin       = None
-_buffer      = b""
+_buffer      = bytearray()
 _environment = None
 _population  = None
+_needs_flush = False
+
+def _flush_replies():
+    # Send any buffered replies before blocking on the next message, so that
+    # the environment is never left waiting on data that this process is
+    # holding in its stdout buffer.
+    global _needs_flush
+    if _needs_flush:
+        sys.stdout.buffer.flush()
+        _needs_flush = False
 
 def _readline():
-    global _stdin, _buffer
-    read_size = 1000
+    global _stdin
+    read_size = 65536
     if _stdin is None:
-        _stdin = open(sys.stdin.fileno(),  mode='rb', buffering=0)
+        _stdin = sys.stdin.fileno()
     if b"\n" not in _buffer:
+        _flush_replies()
         while True:
-            chunk = _stdin.read(read_size)
             # Yield execution if waiting for data.
-            if chunk is None:
+            try:
+                chunk = os.read(_stdin, read_size)
+            except BlockingIOError:
                 time.sleep(0)
                 continue
             # Check for EOF.
             if len(chunk) == 0:
                 raise EOFError("stdin closed")
             # Incorporate the chunk into our internal buffer.
-            _buffer += chunk
+            _buffer.extend(chunk)
             if b"\n" in chunk:
                 break
-    line, _buffer = _buffer.split(b"\n", maxsplit=1)
-    line = line.decode("utf-8")
+    index = _buffer.find(b"\n")
+    line  = bytes(_buffer[:index])
+    del _buffer[:index + 1]
     return line
 
 def _readbytes(num_bytes):
-    global _stdin, _buffer
+    if len(_buffer) < num_bytes:
+        _flush_replies()
     while len(_buffer) < num_bytes:
-        chunk = _stdin.read(num_bytes - len(_buffer))
         # Yield execution if waiting for data.
-        if chunk is None:
+        try:
+            chunk = os.read(_stdin, num_bytes - len(_buffer))
+        except BlockingIOError:
             time.sleep(0)
             continue
         # Check for EOF.
         if len(chunk) == 0:
             raise EOFError("stdin closed")
-        _buffer += chunk
-    data    = _buffer[:num_bytes]
-    _buffer = _buffer[num_bytes:]
+        _buffer.extend(chunk)
+    data = bytes(_buffer[:num_bytes])
+    del _buffer[:num_bytes]
     return data
 
 def _parse_message():
-    # Ignore leading white space and empty lines.
-    while True:
-        message = _readline()
-        message = message.lstrip()
-        if message:
-            break
-        # 
-    msg_type = message[0].upper()
+    message = _readline()
+    # Fast path: peers emit exactly one message per line with no padding,
+    # so the first byte is normally the message type.
+    if not message or message[0] <= 0x20:
+        # Ignore leading white space and empty lines.
+        while True:
+            message = message.lstrip()
+            if message:
+                break
+            message = _readline()
+    msg_type = message[:1].upper()
     msg_body = message[1:]
     return (msg_type, msg_body)
 
@@ -310,62 +599,89 @@ class API:
 
         This function never returns!
         """
-        global _environment, _population
+        # Bind the methods and build the dispatch table once, before the
+        # loop, instead of re-resolving them on every message.
+        set_input  = self.set_input
+        get_output = self.get_output
+
+        def _input(msg_body):
+            gin   = int(msg_body)
+            value = _readline().decode("utf-8")
+            set_input(gin, value)
+
+        def _output(msg_body):
+            global _needs_flush
+            gin   = int(msg_body)
+            value = str(get_output(gin))
+            assert '\n' not in value
+            sys.stdout.buffer.write(b"O%d\n%b\n" % (gin, value.encode("utf-8")))
+            _needs_flush = True
+
+        def _binary(msg_body):
+            gin             = int(msg_body)
+            num_bytes       = int(_readline())
+            binary          = _readbytes(num_bytes)
+            self.set_binary(gin, binary)
+
+        def _advance(msg_body):
+            dt = float(msg_body)
+            self.advance(dt)
+
+        def _reset(msg_body):
+            self.reset()
+
+        def _genome(msg_body):
+            num_bytes = int(msg_body)
+            binary    = _readbytes(num_bytes)
+            self.genome(_environment, _population, binary)
+
+        def _environment_path(msg_body):
+            global _environment
+            _environment = Path(msg_body.decode("utf-8"))
+
+        def _population_name(msg_body):
+            global _population
+            _population = msg_body.decode("utf-8")
+
+        def _save(msg_body):
+            save_state = self.save()
+            sys.stdout.buffer.write("S{}\n".format(len(save_state)).encode("utf-8"))
+            sys.stdout.buffer.write(save_state)
+            sys.stdout.buffer.flush()
+
+        def _load(msg_body):
+            num_bytes  = int(msg_body)
+            save_state = _readbytes(num_bytes)
+            self.load(save_state)
+
+        handlers = {
+            b"I": _input,
+            b"O": _output,
+            b"B": _binary,
+            b"A": _advance,
+            b"R": _reset,
+            b"G": _genome,
+            b"E": _environment_path,
+            b"P": _population_name,
+            b"S": _save,
+            b"L": _load,
+        }
+
+        # Bind the loop's globals to locals for faster lookups.
+        parse_message = _parse_message
+        get_handler   = handlers.get
+        custom        = self.custom
+
         while True:
             try:
-                msg_type, msg_body = _parse_message()
+                msg_type, msg_body = parse_message()
             except EOFError:
                 break
-
-            if msg_type == "I":
-                gin   = int(msg_body)
-                value = _readline()
-                self.set_input(gin, value)
-
-            elif msg_type == "O":
-                gin   = int(msg_body)
-                value = str(self.get_output(gin))
-                assert '\n' not in value
-                reply = f"O{gin}\n{value}"
-                print(reply, flush=True)
-
-            elif msg_type == "B":
-                gin             = int(msg_body)
-                num_bytes       = _readline()
-                binary          = _readbytes(num_bytes)
-                self.set_binary(gin, binary)
-
-            elif msg_type == "A":
-                dt = float(msg_body)
-                self.advance(dt)
-
-            elif msg_type == "R":
-                self.reset()
-
-            elif msg_type == "G":
-                num_bytes = int(msg_body)
-                binary    = _readbytes(num_bytes)
-                self.genome(_environment, _population, binary)
-
-            elif msg_type == "E":
-                _environment = Path(msg_body)
-
-            elif msg_type == "P":
-                _population = msg_body
-
-            elif msg_type == "S":
-                save_state = self.save()
-                sys.stdout.buffer.write("S{}\n".format(len(save_state)).encode("utf-8"))
-                sys.stdout.buffer.write(save_state)
-                sys.stdout.buffer.flush()
-
-            elif msg_type == "L":
-                num_bytes  = int(msg_body)
-                save_state = _readbytes(num_bytes)
-                self.load(save_state)
-
+            handler = get_handler(msg_type)
+            if handler is not None:
+                handler(msg_body)
             else:
-                self.custom(msg_type, msg_body)
+                custom(msg_type.decode("utf-8"), msg_body.decode("utf-8"))
 
         self.quit()
 
@@ -6,7 +6,9 @@ All global functions in this module are for implementing environment programs.
 
 from pathlib import Path
 import collections
+import copy
 import datetime
+import functools
 import json
 import os
 import subprocess
@@ -33,9 +35,19 @@ def _timestamp():
 def Specification(env_spec_path):
     """
     Load an environment specification from file.
+
+    The results are cached, keyed on the file's path, size, and modification
+    time, so that programs which load the same file many times skip the parse
+    and validation work. Every caller receives their own copy.
     """
     # Clean up the filesystem path argument.
     env_spec_path = Path(env_spec_path).expanduser().resolve()
+    file_stat     = os.stat(env_spec_path)
+    env_spec      = _load_env_spec(env_spec_path, file_stat.st_mtime_ns, file_stat.st_size)
+    return copy.deepcopy(env_spec)
+
+@functools.lru_cache(maxsize=64)
+def _load_env_spec(env_spec_path, mtime_ns, size):
     # Read the file into memory.
     with open(env_spec_path, 'rt') as env_spec_file:
         env_spec_data = env_spec_file.read()
@@ -344,9 +356,11 @@ def spawn(population=None):
 
     Argument population is optional if the environment has exactly one population.
     """
-    if population is not None:
-        population = str(population)
-    _try_print(json.dumps({"Spawn": population}))
+    # The envelope is constant, so only the payload is serialized.
+    if population is None:
+        _try_print('{"Spawn": null}')
+    else:
+        _try_print('{"Spawn": %s}' % json.dumps(str(population)))
 
 def mate(*parents):
     """
@@ -383,8 +397,7 @@ def death(name):
     The individual's score or reproductive fitness should be reported
     using the "score()" function *before* calling this method.
     """
-    name = str(name)
-    _try_print(json.dumps({"Death": name}))
+    _try_print('{"Death": %s}' % json.dumps(str(name)))
 
 class SoloAPI:
     """
@@ -521,8 +534,19 @@ class Environment:
             [self._env_spec["path"], self._env_spec["spec"], self._mode] + settings_list,
             stdin  = subprocess.PIPE,
             stdout = subprocess.PIPE,
-            stderr = stderr)
-        os.set_blocking(self._process.stdout.fileno(), False)
+            stderr = stderr,
+            bufsize = 65536)
+        self._stdout_fd = self._process.stdout.fileno()
+        self._rx_buf    = bytearray() # Partial messages from the environment's stdout.
+        self._rx_queue  = collections.deque() # Complete messages, not yet processed.
+        os.set_blocking(self._stdout_fd, False)
+        # Dispatch table for poll(), keyed on the message's tag.
+        self._handlers  = {
+            "Spawn":     self._handle_spawn,
+            "Score":     self._handle_score,
+            "Telemetry": self._handle_telemetry,
+            "Death":     self._handle_death,
+        }
 
     def is_alive(self):
         """
@@ -530,6 +554,30 @@ class Environment:
         """
         return self._process.poll() is None
 
+    def flush(self):
+        """
+        Send all buffered messages to the environment subprocess.
+
+        Outgoing messages are buffered and written to the environment in
+        batches. "poll()" flushes automatically whenever the pipe runs dry.
+        """
+        self._process.stdin.flush()
+
+    def fileno(self):
+        """
+        Get the file descriptor which this object reads messages from.
+
+        This allows waiting on many environments at once with the standard
+        library's "selectors" module, instead of polling each environment
+        in a busy loop.
+
+        Messages are buffered in user space, so the file descriptor may not
+        signal readable even though messages are waiting. After the selector
+        reports this object as ready, call "poll()" repeatedly until it
+        returns None before waiting on the selector again.
+        """
+        return self._process.stdout.fileno()
+
     def __del__(self):
         if hasattr(self, "_process"): # Guard against crashes in __init__.
             self.quit()
@@ -607,15 +655,21 @@ class Environment:
         controller[0] = str(controller[0]) # Convert Path to String
         phenome = individual.get_phenome()
         metadata = {
-            "name": self.name,
+            "name": individual.name,
             "population": population,
-            "parents": self.parents,
+            "parents": individual.parents,
             "controller": controller,
             "genome": len(phenome),
         }
-        self._process.stdin.write(json.dumps(metadata).encode("utf-8"))
-        self._process.stdin.write(b"\n")
-        self._process.stdin.write(phenome)
+        # Send the metadata line and the phenome in one buffered write,
+        # unless the phenome is large enough that the concatenation copy
+        # costs more than a second write.
+        header = json.dumps(metadata).encode("utf-8") + b"\n"
+        if len(phenome) < 65536:
+            self._process.stdin.write(header + phenome)
+        else:
+            self._process.stdin.write(header)
+            self._process.stdin.write(phenome)
         self._outstanding[individual.name] = individual
         individual.birth_date = _timestamp()
         individual.save(self._tempdir.name)
@@ -627,47 +681,63 @@ class Environment:
 
         This function is non-blocking and should be called periodically.
 
+        Messages are buffered in user space, so callers who wait on
+        "fileno()" readability must call this repeatedly until it returns
+        None before waiting again; otherwise buffered messages are stranded
+        until the pipe next signals readable.
+
         Returns "Spawn" and "Death" messages.
         """
-        # Check for messages.
-        message = self._process.stdout.readline().strip()
-        if not message:
-            # Flush all queued responses on the way out the door.
-            self._process.stdin.flush()
-            return
-
-        # Decode the message.
-        message = json.loads(message)
-
-        # Fill in missing fields.
-        if "Spawn" in message:
-            message["Spawn"] = self._get_population(message["Spawn"])
-        elif "Score" in message or "Telemetry" in message:
-            message["name"] = self._get_name(message["name"])
-        elif "Death" in message:
-            message["Death"] = self._get_name(message["Death"])
-
-        # Process the message if able.
-        if "Score" in message:
-            score       = message["Score"]
-            name        = message["name"]
-            individual  = self._outstanding[name]
-            individual.score = score
-            return # consume the message
-
-        elif "Telemetry" in message:
-            info        = message["Telemetry"]
-            name        = message["name"]
-            individual  = self._outstanding[name]
-            individual.telemetry.update(info)
-            return # consume the message
-
-        elif "Death" in message:
-            name        = message["Death"]
-            individual  = self._outstanding.pop(name)
-            individual.death_date = _timestamp()
-            message["Death"] = individual
+        # Drain everything the pipe currently holds, in bulk.
+        buffer = self._rx_buf
+        try:
+            while chunk := os.read(self._stdout_fd, 65536):
+                buffer.extend(chunk)
+        except BlockingIOError:
+            pass
+        # Split all of the complete messages out of the receive buffer.
+        queue = self._rx_queue
+        while (index := buffer.find(b"\n")) != -1:
+            line = bytes(buffer[:index]).strip()
+            del buffer[:index + 1]
+            if line:
+                queue.append(line)
+        # Process the buffered messages until one must be returned.
+        while queue:
+            message = json.loads(queue.popleft())
+            # Dispatch on the message's tag. Unrecognized messages are
+            # returned to the caller as-is.
+            for tag in message:
+                if handler := self._handlers.get(tag):
+                    message = handler(message)
+                    break
+            if message is not None:
+                return message
+        # Flush all queued responses on the way out the door.
+        self._process.stdin.flush()
+        return None
+
+    def _handle_spawn(self, message):
+        message["Spawn"] = self._get_population(message["Spawn"])
+        return message
 
+    def _handle_score(self, message):
+        name        = self._get_name(message["name"])
+        individual  = self._outstanding[name]
+        individual.score = message["Score"]
+        return None # consume the message
+
+    def _handle_telemetry(self, message):
+        name        = self._get_name(message["name"])
+        individual  = self._outstanding[name]
+        individual.telemetry.update(message["Telemetry"])
+        return None # consume the message
+
+    def _handle_death(self, message):
+        name        = self._get_name(message["Death"])
+        individual  = self._outstanding.pop(name)
+        individual.death_date = _timestamp()
+        message["Death"] = individual
         return message
 
     def evolve(self, populations):
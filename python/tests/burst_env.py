@@ -0,0 +1,34 @@
+#!/usr/bin/python
+
+"""
+Scripted environment for testing the environment interface.
+
+It requests one individual, reports on it in a single burst, and waits for
+its stdin to close.
+"""
+
+import json
+import sys
+
+def main():
+    spec, mode, *settings = sys.argv[1:]
+    # Request an individual.
+    sys.stdout.write('{"Spawn": null}\n')
+    sys.stdout.flush()
+    # Read the metadata line and the genome.
+    metadata = json.loads(sys.stdin.buffer.readline())
+    genome   = sys.stdin.buffer.read(int(metadata["genome"]))
+    name     = metadata["name"]
+    # Report on the individual in a single write, so that every message
+    # arrives in the caller's receive buffer at once.
+    sys.stdout.write(
+        json.dumps({"Telemetry": {"test": "data"}, "name": name}) + "\n" +
+        json.dumps({"Score": "42", "name": name}) + "\n" +
+        json.dumps({"Death": name}) + "\n" +
+        '{"Spawn": null}\n')
+    sys.stdout.flush()
+    # Wait for the caller to finish before exiting.
+    sys.stdin.buffer.read()
+
+if __name__ == "__main__":
+    main()
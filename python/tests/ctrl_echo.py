@@ -0,0 +1,45 @@
+#!/usr/bin/python
+
+"""
+Scripted controller for testing the controller interface.
+
+Outputs echo the genome's tag and the most recent input on that GIN, so that
+the tests can tell the controllers, the replies, and the save states apart.
+"""
+
+import sys
+from pathlib import Path
+
+# Allow running straight out of the repository, without installing the package.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from npc_maker.ctrl import API
+
+class Echo(API):
+    def genome(self, environment, population, value):
+        self.tag    = value.decode("utf-8").strip()
+        self.inputs = {}
+
+    def reset(self):
+        self.inputs = {}
+
+    def advance(self, dt):
+        pass
+
+    def set_input(self, gin, value):
+        self.inputs[gin] = value
+
+    def set_binary(self, gin, binary):
+        self.inputs[gin] = binary.decode("utf-8")
+
+    def get_output(self, gin):
+        return "{}:{}".format(self.tag, self.inputs.get(gin, ""))
+
+    def save(self):
+        return repr(sorted(self.inputs.items())).encode("utf-8")
+
+    def load(self, save_state):
+        self.inputs = dict(eval(save_state))
+
+if __name__ == "__main__":
+    Echo().main()
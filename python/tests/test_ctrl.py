@@ -0,0 +1,74 @@
+from npc_maker.ctrl import Controller, Gather
+from pathlib import Path
+import sys
+import tempfile
+
+ctrl_prog = Path(__file__).parent.joinpath("ctrl_echo.py")
+
+def make_controller(tag):
+    x = Controller("test_env", "test_pop", [sys.executable, ctrl_prog])
+    x.genome(tag)
+    return x
+
+def test_gather():
+    controllers = [make_controller(tag) for tag in ("a", "b", "c")]
+    gather = Gather()
+    for x in controllers:
+        gather.add(x, [1, 2])
+        gather.add(x, 2) # Duplicate requests are only answered once.
+    results = gather.run()
+    assert len(results) == 3
+    for x, tag in zip(controllers, ("a", "b", "c")):
+        assert results[x] == {1: tag + ":", 2: tag + ":"}
+
+def test_save_load():
+    x = make_controller("s")
+    x.set_input(1, "hello")
+    assert x.get_outputs(1) == "s:hello"
+    save_state = x.save()
+    x.reset()
+    assert x.get_outputs(1) == "s:"
+    x.load(save_state)
+    assert x.get_outputs(1) == "s:hello"
+    # Round-trip the save state through a file.
+    file = tempfile.NamedTemporaryFile(suffix=".save", delete=False)
+    try:
+        file.write(save_state)
+        file.close()
+        y = make_controller("s")
+        y.load_from_file(file.name)
+        assert y.get_outputs(1) == "s:hello"
+    finally:
+        Path(file.name).unlink()
+
+def test_set_binary():
+    x = make_controller("b")
+    x.set_binary(5, b"binary blob")
+    assert x.get_outputs(5) == "b:binary blob"
+
+def test_duplicate_gins():
+    # Duplicate requests are discarded, instead of leaving this process
+    # waiting on replies that never come.
+    x = make_controller("d")
+    assert x.get_outputs([1, 1, 2, 1]) == {1: "d:", 2: "d:"}
+
+def test_decode():
+    x = make_controller("r")
+    gin_list = x.request_outputs([3])
+    assert x.receive_outputs(gin_list, decode=False) == {3: b"r:"}
+    gin_list = x.request_outputs([3])
+    assert x.receive_outputs(gin_list) == {3: "r:"}
+
+def test_genome_from_file():
+    # Large enough to exercise the file streaming path, the trailing
+    # padding is stripped off by the controller.
+    genome = b"big" + b" " * 100000
+    file = tempfile.NamedTemporaryFile(suffix=".genome", delete=False)
+    try:
+        file.write(genome)
+        file.close()
+        x = Controller("test_env", "test_pop", [sys.executable, ctrl_prog])
+        x.genome_from_file(file.name)
+        assert x.get_outputs(0) == "big:"
+    finally:
+        Path(file.name).unlink()
@@ -9,3 +9,14 @@ def test_env_spec():
     for env_spec in examples_dir.glob("*/*.env"):
         print(f"Loading Environment Specification: \"{env_spec}\" ...")
         pprint(env.Specification(env_spec))
+
+def test_env_spec_cache():
+    # Repeated loads are served from a cache, and every caller gets their
+    # own copy.
+    env_spec = Path(__file__).parent.joinpath("burst.env")
+    spec_1 = env.Specification(env_spec)
+    spec_2 = env.Specification(env_spec)
+    assert spec_1 == spec_2
+    assert spec_1 is not spec_2
+    spec_2["name"] = "mutated"
+    assert env.Specification(env_spec)["name"] == spec_1["name"]
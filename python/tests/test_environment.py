@@ -0,0 +1,35 @@
+from npc_maker import env
+from npc_maker.evo import Individual
+from pathlib import Path
+import time
+
+env_spec = Path(__file__).parent.joinpath("burst.env")
+
+def wait_for_message(environment):
+    deadline = time.monotonic() + 10
+    while (message := environment.poll()) is None:
+        assert time.monotonic() < deadline, "timed out waiting for the environment"
+        time.sleep(0.01)
+    return message
+
+def test_poll_drains_bursts():
+    e = env.Environment(env_spec, "headless")
+    # Wait for the environment to request an individual.
+    message = wait_for_message(e)
+    assert message["Spawn"] == "test_pop"
+    individual = Individual(b"test_genome", controller=["/bin/true"])
+    e.birth(individual)
+    assert e.get_outstanding() == {individual.name: individual}
+    # The environment reports Telemetry, Score, Death, and a new Spawn in a
+    # single burst. The Score and Telemetry must be applied to the individual
+    # and both of the returnable messages must come out of poll() before it
+    # returns None, without waiting on the pipe again.
+    message = wait_for_message(e)
+    assert message["Death"] is individual
+    assert individual.score == "42"
+    assert individual.telemetry == {"test": "data"}
+    message = e.poll()
+    assert message is not None and message["Spawn"] == "test_pop"
+    assert e.poll() is None
+    assert not e._rx_buf and not e._rx_queue
+    e.quit()